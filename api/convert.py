@@ -6,21 +6,20 @@ into an .ics calendar file and streams it back to the caller.
 """
 
 from __future__ import annotations
-import sys, uuid, json, re
-from datetime import datetime, timedelta
+import sys, uuid, json, re, hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from io import BytesIO
+from itertools import count, islice
+import zipfile
 from http.server import BaseHTTPRequestHandler
 from urllib.parse import parse_qs
-import cgi
 import traceback
 
-# Lazy heavy imports
-try:
-    import pandas as pd  # type: ignore
-    from dateutil import parser as date_parser  # type: ignore
-except Exception:
-    pd = None  # type: ignore
-    date_parser = None  # type: ignore
+from openpyxl import Workbook, load_workbook
+from streaming_form_data import StreamingFormDataParser, ParseFailedException
+from streaming_form_data.targets import ValueTarget
 
 VTIMEZONE_BLOCK = """BEGIN:VTIMEZONE
 TZID:America/Vancouver
@@ -40,134 +39,261 @@ RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU
 END:DAYLIGHT
 END:VTIMEZONE"""
 
+CAL_HEADER = f"BEGIN:VCALENDAR\nVERSION:2.0\nCALSCALE:GREGORIAN\n{VTIMEZONE_BLOCK}\n".encode("utf-8")
+CAL_FOOTER = b"END:VCALENDAR\n"
+
 LABOR_DAY_2025 = datetime(2025, 9, 1).date()
+LABOR_DAY_STR = LABOR_DAY_2025.strftime("%Y%m%d")
+
+# Limits for untrusted uploads; a real export is a ~7 KB zip of ~10 parts
+MAX_UPLOAD_BYTES = 5_000_000
+MAX_XLSX_PARTS = 50
+MAX_XLSX_UNCOMPRESSED = 50_000_000
+MAX_ROWS = 20_000
+
+# Parsed rows of recent uploads, keyed by content digest; warm instances skip the
+# workbook parse when a client retries the same file
+ROW_CACHE_SIZE = 32
+_row_cache: OrderedDict = OrderedDict()
 
 DAY_MAP = {
     "Mon": "MO", "Tue": "TU", "Wed": "WE", "Thu": "TH",
     "Fri": "FR", "Sat": "SA", "Sun": "SU",
 }
+_DAY_TOKEN_RE = re.compile("|".join(DAY_MAP))
+_DAY_BIT = {tok: 1 << i for i, tok in enumerate(DAY_MAP)}
+_DAY_ORDER = tuple(DAY_MAP.values())
+_ICS_TEXT_ESCAPE = str.maketrans({"\\": "\\\\", ",": "\\,", ";": "\\;", "\n": "\\n"})
+
+def make_uids():
+    """One random base per calendar plus a running counter keeps UIDs unique."""
+    base = uuid.uuid4().hex
+    for n in count(1):
+        yield f"{base}-{n}@ubc-xlsx-to-ics"
 
-def make_uid() -> str:
-    return f"{uuid.uuid4()}@ubc-xlsx-to-ics"
+def _ics_ts(dt: datetime) -> str:
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
 
 def make_dtstamp() -> str:
-    try:
-        return datetime.now(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
-    except AttributeError:  # <3.11 fallback
-        return datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    return f"{_ics_ts(datetime.now(timezone.utc))}Z"
+
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})\s*[-–]\s*(\d{4}-\d{2}-\d{2})')
+_TIME_JUNK_RE = re.compile(r"[\s.]+")
+_HEADER_RE = re.compile(r"course listing", re.I)
+
+def _norm_time(t: str):
+    """'4:00 p.m.' -> ('4:00PM', True); '15:30PM' -> ('15:30', False)."""
+    t = _TIME_JUNK_RE.sub("", t).upper()
+    if t[-2:] in ("AM", "PM"):
+        if int(t.split(":", 1)[0]) <= 12:
+            return t, True
+        t = t[:-2]  # stray suffix on a 24h time
+    return t, False
+
+@lru_cache(maxsize=256)
+def _mk_dt(date_s: str, time_s: str) -> datetime:
+    t, is_12h = _norm_time(time_s)
+    return datetime.strptime(f"{date_s} {t}", "%Y-%m-%d %I:%M%p" if is_12h else "%Y-%m-%d %H:%M")
 
 def parse_meeting_pattern(pattern: str):
     # Same logic as earlier index.py
     try:
-        if not pattern or pattern.strip() == "":
+        if not pattern or "|" not in pattern:
             return (None,) * 6
-        parts = [p.strip() for p in pattern.split("|")]
-        if len(parts) < 4:
-            parts.extend([''] * (4 - len(parts)))
-        date_range, days, times, location = parts[0], parts[1], parts[2], parts[3]
-        date_match = re.match(r'(\d{4}-\d{2}-\d{2})\s*[-–]\s*(\d{4}-\d{2}-\d{2})', date_range)
+        date_range, _, rest = pattern.partition("|")
+        days, _, rest = rest.partition("|")
+        times, _, location = rest.partition("|")
+        date_match = _DATE_RE.match(date_range.strip())
         if not date_match:
             return (None,) * 6
         start_date, end_date = date_match.groups()
+        times = times.strip()
         if " - " in times:
-            start_time, end_time = [t.strip() for t in times.split(" - ")]
+            start_time, _, end_time = times.partition(" - ")
         elif "-" in times:
-            start_time, end_time = [t.strip() for t in times.split("-")]
+            start_time, _, end_time = times.partition("-")
         else:
             return (None,) * 6
-        return start_date, end_date, days, start_time, end_time, location
+        return start_date, end_date, days.strip(), start_time.strip(), end_time.strip(), location.strip()
     except Exception:
         return (None,) * 6
 
-def convert_excel_to_ics(file_content: bytes):
-    global pd, date_parser
-    if pd is None or date_parser is None:
-        try:
-            import importlib
-            pd = importlib.import_module("pandas")  # type: ignore
-            date_parser = importlib.import_module("dateutil.parser")  # type: ignore
-        except ModuleNotFoundError as ie:
-            return None, f"Missing Python dependency: {ie.name}"
+def _cell(row: tuple, idx):
+    if idx is None or idx >= len(row) or row[idx] is None:
+        return ""
+    return str(row[idx]).strip()
+
+def iter_course_rows(ws):
+    """Stream (section, meeting patterns, instructor) from rows below the header."""
+    rows = islice(ws.iter_rows(values_only=True), MAX_ROWS)
+    for row in rows:
+        if any(c is not None and _HEADER_RE.search(str(c)) for c in row):
+            break
+    else:
+        # No header cell found: fall back to row 2, where Workday puts it
+        rows = islice(ws.iter_rows(values_only=True), MAX_ROWS)
+        row = next(islice(rows, 2, None), None)
+        if row is None:
+            return
+    hdr = {str(c).strip(): i for i, c in enumerate(row) if c is not None}
+    i_sec, i_pat, i_ins = hdr.get("Section"), hdr.get("Meeting Patterns"), hdr.get("Instructor")
+    if i_sec is None or i_pat is None:
+        return
+    for row in rows:
+        section_info, patterns = _cell(row, i_sec), _cell(row, i_pat)
+        if section_info and patterns:
+            yield section_info, patterns, _cell(row, i_ins)
+
+def check_xlsx_limits(file_content: bytes):
+    """Reject zip-bomb style workbooks from the central directory alone."""
+    try:
+        with zipfile.ZipFile(BytesIO(file_content)) as zf:
+            parts = zf.infolist()
+    except zipfile.BadZipFile:
+        return "File is not a valid .xlsx workbook"
+    if len(parts) > MAX_XLSX_PARTS:
+        return f"Workbook has too many parts ({len(parts)})"
+    if sum(p.file_size for p in parts) > MAX_XLSX_UNCOMPRESSED:
+        return "Workbook is too large when uncompressed"
+    return None
+
+def load_course_rows(file_content: bytes) -> tuple:
+    """Parsed course rows of an upload, served from the digest-keyed LRU when seen recently."""
+    key = hashlib.sha256(file_content).digest()
+    rows = _row_cache.get(key)
+    if rows is not None:
+        _row_cache.move_to_end(key)
+        return rows
+    wb = load_workbook(BytesIO(file_content), read_only=True, data_only=True,
+                       keep_vba=False, keep_links=False, rich_text=False)
+    try:
+        ws = wb.worksheets[0]
+        ws.reset_dimensions()  # Workday exports carry a bogus <dimension> tag
+        rows = tuple(iter_course_rows(ws))
+    finally:
+        wb.close()
+    _row_cache[key] = rows
+    if len(_row_cache) > ROW_CACHE_SIZE:
+        _row_cache.popitem(last=False)
+    return rows
 
+def convert_excel_to_ics(file_content: bytes):
+    err = check_xlsx_limits(file_content)
+    if err:
+        return None, err
     try:
-        buf = BytesIO(file_content)
-        raw = pd.read_excel(buf, header=None, engine='openpyxl')
-        mask = raw.apply(lambda r: r.astype(str).str.contains(r"Course Listing", case=False, na=False).any(), axis=1)
-        hdr_idx = int(mask.idxmax()) if mask.any() else 2
-        buf.seek(0)
-        df = pd.read_excel(buf, header=hdr_idx, engine='openpyxl')
-
-        events = []
-        for _, row in df.iterrows():
-            section_info = str(row.get("Section", "")).strip()
-            patterns = str(row.get("Meeting Patterns", "")).strip()
-            instr = str(row.get("Instructor", "")).strip()
-            if not (section_info and patterns):
-                continue
-            summary = section_info.replace("_V", "")
+        rows = load_course_rows(file_content)
+
+        dtstamp = make_dtstamp()
+        uids = make_uids()
+        out = bytearray(CAL_HEADER)
+        for section_info, patterns, instr in rows:
+            summary = section_info.replace("_V", "").translate(_ICS_TEXT_ESCAPE)
             for line in patterns.split("\n"):
                 sd, ed, days, st, et, loc = parse_meeting_pattern(line)
-                if not all([sd, ed, days, st, et]):
+                if not (sd and ed and days and st and et):
                     continue
-                byday = [DAY_MAP[d] for d in DAY_MAP if d in days]
-                if not byday:
+                day_mask = 0
+                for tok in _DAY_TOKEN_RE.findall(days):
+                    day_mask |= _DAY_BIT[tok]
+                if not day_mask:
                     continue
-                dt_start0 = date_parser.parse(f"{sd} {st}")
-                dt_end0 = date_parser.parse(f"{sd} {et}")
-                until_dt = date_parser.parse(f"{ed} {et}")
+                byday = [_DAY_ORDER[i] for i in range(7) if day_mask >> i & 1]
+                dt_start0 = _mk_dt(sd, st)
+                dt_end0 = _mk_dt(sd, et)
+                until_dt = _mk_dt(ed, et)
+                loc = loc.translate(_ICS_TEXT_ESCAPE)
+                desc = f"Instructor: {instr}\nTime: {days} {st}-{et}".translate(_ICS_TEXT_ESCAPE)
                 exdate = ""
-                if "MO" in byday and LABOR_DAY_2025 >= dt_start0.date() <= until_dt.date():
-                    labor_dt = datetime.combine(LABOR_DAY_2025, dt_start0.time())
-                    exdate = f"EXDATE;TZID=America/Vancouver:{labor_dt.strftime('%Y%m%dT%H%M%S')}\n"
-                events.append(f"""BEGIN:VEVENT
-UID:{make_uid()}
-DTSTAMP:{make_dtstamp()}
+                if day_mask & 1 and dt_start0.date() <= LABOR_DAY_2025 <= until_dt.date():
+                    exdate = f"EXDATE;TZID=America/Vancouver:{LABOR_DAY_STR}T{dt_start0.hour:02d}{dt_start0.minute:02d}{dt_start0.second:02d}\n"
+                out += f"""BEGIN:VEVENT
+UID:{next(uids)}
+DTSTAMP:{dtstamp}
 SUMMARY:{summary}
-DTSTART;TZID=America/Vancouver:{dt_start0.strftime('%Y%m%dT%H%M%S')}
-DTEND;TZID=America/Vancouver:{dt_end0.strftime('%Y%m%dT%H%M%S')}
-RRULE:FREQ=WEEKLY;BYDAY={','.join(byday)};UNTIL={until_dt.strftime('%Y%m%dT%H%M%S')}
+DTSTART;TZID=America/Vancouver:{_ics_ts(dt_start0)}
+DTEND;TZID=America/Vancouver:{_ics_ts(dt_end0)}
+RRULE:FREQ=WEEKLY;BYDAY={','.join(byday)};UNTIL={_ics_ts(until_dt)}
 {exdate}LOCATION:{loc}
-DESCRIPTION:Instructor: {instr}\\nTime: {days} {st}-{et}
-END:VEVENT""")
-        if not events:
+DESCRIPTION:{desc}
+END:VEVENT
+""".encode("utf-8")
+        if len(out) == len(CAL_HEADER):
             return None, "No events found in the spreadsheet"
-        cal = "\n".join(["BEGIN:VCALENDAR", "VERSION:2.0", "CALSCALE:GREGORIAN", VTIMEZONE_BLOCK, *events, "END:VCALENDAR"])
-        return cal, None
+        out += CAL_FOOTER
+        return bytes(out), None
     except Exception as e:
         return None, traceback.format_exc(limit=4)
 
+def _warm_openpyxl() -> None:
+    """Round-trip a one-cell workbook so openpyxl's reader modules load at init."""
+    buf = BytesIO()
+    Workbook().save(buf)
+    wb = load_workbook(buf, read_only=True, data_only=True)
+    try:
+        for _ in wb.worksheets[0].iter_rows(values_only=True):
+            pass
+    finally:
+        wb.close()
+
+# Runs once per container during the (unbilled) module init phase
+_warm_openpyxl()
+
+READ_CHUNK = 64 * 1024
+
+def read_form_file(headers, rfile, field: str = "file") -> bytes:
+    """Feed the multipart body to the parser in chunks and return the named part."""
+    parser = StreamingFormDataParser(headers=headers)
+    target = ValueTarget()
+    parser.register(field, target)
+    remaining = int(headers.get('Content-Length') or 0)
+    while remaining > 0:
+        chunk = rfile.read(min(remaining, READ_CHUNK))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        parser.data_received(chunk)
+    return target.value
+
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         try:
-            ctype, pdict = cgi.parse_header(self.headers.get('content-type'))
-            if ctype != 'multipart/form-data':
+            if self.headers.get_content_type() != 'multipart/form-data':
                 self._err(400, 'Content-Type must be multipart/form-data')
                 return
-            pdict['boundary'] = bytes(pdict['boundary'], 'utf-8')
-            fields = cgi.parse_multipart(self.rfile, pdict)
-            fdata = fields.get('file')
+            if int(self.headers.get('Content-Length') or 0) > MAX_UPLOAD_BYTES:
+                self._err(413, 'File too large')
+                return
+            try:
+                fdata = read_form_file(self.headers, self.rfile)
+            except ParseFailedException as e:
+                self._err(400, f'Malformed multipart body: {e}')
+                return
             if not fdata:
                 self._err(400, 'No file field in form')
                 return
-            ics, err = convert_excel_to_ics(fdata[0])
+            ics, err = convert_excel_to_ics(fdata)
             if err:
                 self._err(400, f"Conversion error: {err}")
                 return
             self.send_response(200)
             self.send_header('Content-Type', 'text/calendar')
             self.send_header('Content-Disposition', 'attachment; filename="courses.ics"')
+            self.send_header('Content-Length', str(len(ics)))
             self.end_headers()
-            self.wfile.write(ics.encode('utf-8'))
+            self.wfile.write(ics)
         except Exception as e:
             tb = traceback.format_exc()
             print(tb, file=sys.stderr)
             self._err(500, 'Internal server error', tb)
 
     def _err(self, code, msg, tb=None):
-        self.send_response(code)
-        self.send_header('Content-Type', 'application/json')
-        self.end_headers()
         payload = {'error': msg}
         if tb:
             payload['traceback'] = tb
-        self.wfile.write(json.dumps(payload).encode()) 
\ No newline at end of file
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
\ No newline at end of file
@@ -5,24 +5,25 @@ RFC 5545 .ics files for Google Calendar.
 """
 
 from __future__ import annotations
-import sys, uuid, re, json
-from datetime import datetime, timedelta
+import sys, uuid, re, json, hashlib
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
 from io import BytesIO
+from itertools import count, islice
+import zipfile
 
-# We will import heavy libraries lazily inside functions to avoid import-time failures
-try:
-    import pandas as pd  # type: ignore
-    from dateutil import parser as date_parser  # type: ignore
-except Exception:
-    # We will handle missing dependencies later during function call
-    pd = None  # type: ignore
-    date_parser = None  # type: ignore
+# openpyxl is imported (and warmed, see _warm_openpyxl) at module load so the cost lands
+# in the serverless init phase instead of the first billed request
+from openpyxl import Workbook, load_workbook
 
 from http.server import BaseHTTPRequestHandler
 import json
 from urllib.parse import parse_qs
-import cgi
+import textwrap
 import traceback
+from streaming_form_data import StreamingFormDataParser, ParseFailedException
+from streaming_form_data.targets import ValueTarget
 # remove tempfile import as it's no longer needed
 # import tempfile
 
@@ -45,25 +46,77 @@ RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU
 END:DAYLIGHT
 END:VTIMEZONE"""
 
+CAL_HEADER = f"BEGIN:VCALENDAR\nVERSION:2.0\nCALSCALE:GREGORIAN\n{VTIMEZONE_BLOCK}\n".encode("utf-8")
+CAL_FOOTER = b"END:VCALENDAR\n"
+
 # Only exclude Labor Day
 LABOR_DAY_2025 = datetime(2025, 9, 1).date()
+LABOR_DAY_STR = LABOR_DAY_2025.strftime("%Y%m%d")
+
+# Upper bounds for untrusted uploads. A real "View My Courses" export is a ~7 KB zip
+# with ~10 parts and a few dozen rows, so these only ever trip on hostile input.
+MAX_UPLOAD_BYTES = 5_000_000       # request body size
+MAX_XLSX_PARTS = 50                # entries in the zip central directory
+MAX_XLSX_UNCOMPRESSED = 50_000_000 # declared uncompressed size of all parts
+MAX_ROWS = 20_000                  # worksheet rows scanned
+
+# Parsed rows of recently seen uploads, keyed by SHA-256 of the file. Rows are a few
+# short strings each, so even a full cache stays well under a megabyte.
+ROW_CACHE_SIZE = 32
+_row_cache: OrderedDict = OrderedDict()
 
 DAY_MAP = {
     "Mon": "MO", "Tue": "TU", "Wed": "WE", "Thu": "TH",
     "Fri": "FR", "Sat": "SA", "Sun": "SU",
 }
+# Day tokens are matched in one regex scan and folded into a Mon=bit0 .. Sun=bit6 mask
+_DAY_TOKEN_RE = re.compile("|".join(DAY_MAP))
+_DAY_BIT = {tok: 1 << i for i, tok in enumerate(DAY_MAP)}
+_DAY_ORDER = tuple(DAY_MAP.values())
+_ICS_TEXT_ESCAPE = str.maketrans({"\\": "\\\\", ",": "\\,", ";": "\\;", "\n": "\\n"})
+
+def make_uids():
+    """
+    Yield event UIDs for one calendar: a single uuid4 base plus a running counter is
+    still globally unique but reads the OS RNG once instead of once per event.
+    """
+    base = uuid.uuid4().hex
+    for n in count(1):
+        yield f"{base}-{n}@ubc-xlsx-to-ics"
 
-def make_uid() -> str:
-    return f"{uuid.uuid4()}@ubc-xlsx-to-ics"
+def _ics_ts(dt: datetime) -> str:
+    """Format dt as an RFC 5545 local DATE-TIME (YYYYMMDDTHHMMSS) without going through strftime"""
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
 
 def make_dtstamp() -> str:
     """Generate a timestamp in UTC format per RFC 5545"""
-    try:
-        # Python 3.11+ preferred method
-        return datetime.now(datetime.UTC).strftime("%Y%m%dT%H%M%SZ")
-    except AttributeError:
-        # Fallback for older Python versions
-        return datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+    return f"{_ics_ts(datetime.now(timezone.utc))}Z"
+
+_DATE_RE = re.compile(r'(\d{4}-\d{2}-\d{2})\s*[-–]\s*(\d{4}-\d{2}-\d{2})')
+_TIME_JUNK_RE = re.compile(r"[\s.]+")
+_HEADER_RE = re.compile(r"course listing", re.I)
+
+def _norm_time(t: str):
+    """
+    Canonicalize a Workday time for strptime and report whether it is 12-hour:
+        "4:00 p.m." -> ("4:00PM", True)
+        "15:30PM"   -> ("15:30", False)   (stray suffix after a 24h time)
+    """
+    t = _TIME_JUNK_RE.sub("", t).upper()
+    if t[-2:] in ("AM", "PM"):
+        if int(t.split(":", 1)[0]) <= 12:
+            return t, True
+        t = t[:-2]
+    return t, False
+
+@lru_cache(maxsize=256)
+def _mk_dt(date_s: str, time_s: str) -> datetime:
+    """
+    Combine a YYYY-MM-DD date and a Workday time into a naive local datetime.
+    Cached: lecture/tutorial lines of a course usually share their start and end dates.
+    """
+    t, is_12h = _norm_time(time_s)
+    return datetime.strptime(f"{date_s} {t}", "%Y-%m-%d %I:%M%p" if is_12h else "%Y-%m-%d %H:%M")
 
 def parse_meeting_pattern(pattern: str):
     """
@@ -73,21 +126,20 @@ def parse_meeting_pattern(pattern: str):
         2025-09-05 - 2025-11-28 | Fri (Alternate weeks) | 4:00 p.m. - 6:00 p.m. | ESB-Floor 1-Room 1013
     →  (start_date, end_date, days, start_time, end_time, location)
     """
-    import re
     try:
-        # Check for empty pattern
-        if not pattern or pattern.strip() == '':
+        # Blank or separator-less lines can never parse; skip the splitting and regex work
+        if not pattern or "|" not in pattern:
             return (None,) * 6
             
-        parts = [p.strip() for p in pattern.split("|")]
-        # Handle missing location field
-        if len(parts) < 4:
-            parts.extend([''] * (4 - len(parts)))  # Pad with empty strings if needed
-        date_range, days, times, location = parts[0], parts[1], parts[2], parts[3]
+        # partition always returns three parts, so a missing location simply comes back as ''
+        date_range, _, rest = pattern.partition("|")
+        days, _, rest = rest.partition("|")
+        times, _, location = rest.partition("|")
+        date_range, days, times, location = date_range.strip(), days.strip(), times.strip(), location.strip()
         
         # Try to extract start and end dates using a regex that matches the exact format
         # This handles both formats: "2025-09-05 - 2025-11-28" and "2026-01-06 – 2026-04-09"
-        date_match = re.match(r'(\d{4}-\d{2}-\d{2})\s*[-–]\s*(\d{4}-\d{2}-\d{2})', date_range)
+        date_match = _DATE_RE.match(date_range)
         if date_match:
             start_date, end_date = date_match.groups()
         else:
@@ -96,119 +148,234 @@ def parse_meeting_pattern(pattern: str):
         
         # Split time range - handle both formats: "4:00 p.m. - 6:00 p.m." and "15:30PM-17:00PM"
         if " - " in times:
-            start_time, end_time = [t.strip() for t in times.split(" - ")]
+            start_time, _, end_time = times.partition(" - ")
         elif "-" in times:
-            start_time, end_time = [t.strip() for t in times.split("-")]
+            start_time, _, end_time = times.partition("-")
         else:
             print(f"DEBUG: Invalid time format: '{times}'", file=sys.stderr)
             return (None,) * 6
             
-        return start_date, end_date, days, start_time, end_time, location
+        return start_date, end_date, days, start_time.strip(), end_time.strip(), location
     except Exception as e:
         print(f"DEBUG: Error parsing pattern '{pattern}': {e}", file=sys.stderr)
         return (None,) * 6
 
+def _cell(row: tuple, idx):
+    """Return a stripped string for row[idx], or '' for blank/missing cells"""
+    if idx is None or idx >= len(row) or row[idx] is None:
+        return ""
+    return str(row[idx]).strip()
+
+def iter_course_rows(ws):
+    """
+    Single streaming pass over the worksheet: skip the pre-header rows until the
+    "Course Listing" header is found, then yield (section, meeting patterns, instructor)
+    for every row below it that has both a section and a meeting pattern.
+    """
+    rows = islice(ws.iter_rows(values_only=True), MAX_ROWS)
+    for row in rows:
+        if any(c is not None and _HEADER_RE.search(str(c)) for c in row):
+            break
+    else:
+        # No "Course Listing" cell anywhere: treat worksheet row index 2 as the header,
+        # as Workday exports place it there. The scan used up the iterator, so restart it;
+        # the islice leaves `rows` positioned just after the fallback header row.
+        rows = islice(ws.iter_rows(values_only=True), MAX_ROWS)
+        row = next(islice(rows, 2, None), None)
+        if row is None:
+            return
+    header = {str(c).strip(): i for i, c in enumerate(row) if c is not None}
+
+    # Resolve the column positions once instead of looking them up per row
+    i_sec, i_pat, i_ins = header.get("Section"), header.get("Meeting Patterns"), header.get("Instructor")
+    if i_sec is None or i_pat is None:
+        return
+
+    for row in rows:
+        section_info, patterns = _cell(row, i_sec), _cell(row, i_pat)
+        # Blank spacer/summary rows are dropped before the instructor cell is touched
+        if section_info and patterns:
+            yield section_info, patterns, _cell(row, i_ins)
+
+def check_xlsx_limits(file_content: bytes):
+    """
+    Inspect only the zip central directory and return an error message for
+    workbooks with implausibly many parts or a zip-bomb uncompressed size,
+    so openpyxl never starts parsing them. Returns None if the file looks sane.
+    """
+    try:
+        with zipfile.ZipFile(BytesIO(file_content)) as zf:
+            parts = zf.infolist()
+    except zipfile.BadZipFile:
+        return "File is not a valid .xlsx workbook"
+    if len(parts) > MAX_XLSX_PARTS:
+        return f"Workbook has too many parts ({len(parts)})"
+    if sum(p.file_size for p in parts) > MAX_XLSX_UNCOMPRESSED:
+        return "Workbook is too large when uncompressed"
+    return None
+
+def load_course_rows(file_content: bytes) -> tuple:
+    """
+    Return the parsed (section, meeting patterns, instructor) rows of an upload.
+
+    Rows are cached by the SHA-256 of the file so a warm instance that sees the same
+    upload again (client retries, re-exports) skips the workbook parse entirely.
+    """
+    key = hashlib.sha256(file_content).digest()
+    rows = _row_cache.get(key)
+    if rows is not None:
+        _row_cache.move_to_end(key)
+        return rows
+
+    # Process file in-memory instead of writing to disk; read_only streams the
+    # sheet XML instead of building the full workbook object graph; VBA, external
+    # links and rich text are never used here either
+    wb = load_workbook(BytesIO(file_content), read_only=True, data_only=True,
+                       keep_vba=False, keep_links=False, rich_text=False)
+    try:
+        # Only the first sheet is exported; wb.active would consult the workbook view first
+        ws = wb.worksheets[0]
+        # Workday exports carry a bogus <dimension> tag that truncates read_only iteration
+        ws.reset_dimensions()
+        rows = tuple(iter_course_rows(ws))
+    finally:
+        # Release the archive handle even when parsing fails midway
+        wb.close()
+
+    # Evict the least recently used upload once the cache is full
+    _row_cache[key] = rows
+    if len(_row_cache) > ROW_CACHE_SIZE:
+        _row_cache.popitem(last=False)
+    return rows
+
 def convert_excel_to_ics(file_content: bytes):
+    error = check_xlsx_limits(file_content)
+    if error:
+        return None, error
+
     try:
-        # Ensure pandas and dateutil are available
-        global pd, date_parser
-        if pd is None or date_parser is None:
-            try:
-                import importlib
-                pd = importlib.import_module("pandas")  # type: ignore
-                date_parser = importlib.import_module("dateutil.parser")  # type: ignore
-            except ModuleNotFoundError as ie:
-                return None, f"Missing Python dependency: {ie.name}. Please ensure it is in requirements.txt"
-
-        # Process file in-memory instead of writing to disk
-        file_buffer = BytesIO(file_content)
-        
-        raw = pd.read_excel(file_buffer, header=None, engine='openpyxl')
-        mask = raw.apply(lambda r: r.astype(str).str.contains(r"Course Listing", case=False, na=False).any(), axis=1)
-        hdr_idx = int(mask.idxmax()) if mask.any() else 2
-        
-        # Reset buffer's position to the beginning to be read again
-        file_buffer.seek(0)
-        df = pd.read_excel(file_buffer, header=hdr_idx, engine='openpyxl')
+        rows = load_course_rows(file_content)
         
-        events = []
-        for _, row in df.iterrows():
-            section_info = str(row.get("Section", "")).strip()
-            patterns = str(row.get("Meeting Patterns", "")).strip()
-            instr = str(row.get("Instructor", "")).strip()
-            
-            if not (section_info and patterns): continue
-            
-            summary = section_info.replace("_V", "")
+        # DTSTAMP is the build time of this calendar, so one value serves every event
+        dtstamp = make_dtstamp()
+        uids = make_uids()
+        # Events are encoded straight into one output buffer; no per-event list or final join
+        out = bytearray(CAL_HEADER)
+        for section_info, patterns, instr in rows:
+            # TEXT values are RFC 5545-escaped once per row/line, not per event
+            summary = section_info.replace("_V", "").translate(_ICS_TEXT_ESCAPE)
             
             for line in patterns.split("\n"):
                 sd, ed, days, st, et, loc = parse_meeting_pattern(line)
-                if not all([sd, ed, days, st, et]): continue
-                byday = [DAY_MAP[d] for d in DAY_MAP if d in days]
-                if not byday: continue
+                if not (sd and ed and days and st and et): continue
+                day_mask = 0
+                for tok in _DAY_TOKEN_RE.findall(days):
+                    day_mask |= _DAY_BIT[tok]
+                if not day_mask: continue
+                byday = [_DAY_ORDER[i] for i in range(7) if day_mask >> i & 1]
 
-                dt_start0 = date_parser.parse(f"{sd} {st}")
-                dt_end0 = date_parser.parse(f"{sd} {et}")
-                until_dt = date_parser.parse(f"{ed} {et}")
+                dt_start0 = _mk_dt(sd, st)
+                dt_end0 = _mk_dt(sd, et)
+                until_dt = _mk_dt(ed, et)
                 
                 exdate = ""
-                if "MO" in byday:
+                if day_mask & 1:
                     start_date = dt_start0.date()
                     weekday_diff = (0 - start_date.weekday()) % 7
                     first_monday = start_date + timedelta(days=weekday_diff)
                     if first_monday == LABOR_DAY_2025:
                         dt_start0 += timedelta(days=7)
                         dt_end0 += timedelta(days=7)
-                    if LABOR_DAY_2025 >= dt_start0.date() and LABOR_DAY_2025 <= until_dt.date():
-                        labor_day_dt = datetime.combine(LABOR_DAY_2025, dt_start0.time())
-                        labor_day_str = labor_day_dt.strftime("%Y%m%dT%H%M%S")
-                        exdate = f"EXDATE;TZID=America/Vancouver:{labor_day_str}\n"
+                    if dt_start0.date() <= LABOR_DAY_2025 <= until_dt.date():
+                        exdate = f"EXDATE;TZID=America/Vancouver:{LABOR_DAY_STR}T{dt_start0.hour:02d}{dt_start0.minute:02d}{dt_start0.second:02d}\n"
                 
-                dts = dt_start0.strftime("%Y%m%dT%H%M%S")
-                dte = dt_end0.strftime("%Y%m%dT%H%M%S")
-                until = until_dt.strftime("%Y%m%dT%H%M%S")
-                events.append(f"""BEGIN:VEVENT
-UID:{make_uid()}
-DTSTAMP:{make_dtstamp()}
+                dts = _ics_ts(dt_start0)
+                dte = _ics_ts(dt_end0)
+                until = _ics_ts(until_dt)
+                loc = loc.translate(_ICS_TEXT_ESCAPE)
+                desc = f"Instructor: {instr}\nTime: {days} {st}-{et}".translate(_ICS_TEXT_ESCAPE)
+                out += f"""BEGIN:VEVENT
+UID:{next(uids)}
+DTSTAMP:{dtstamp}
 SUMMARY:{summary}
 DTSTART;TZID=America/Vancouver:{dts}
 DTEND;TZID=America/Vancouver:{dte}
 RRULE:FREQ=WEEKLY;BYDAY={','.join(byday)};UNTIL={until}
 {exdate}LOCATION:{loc}
-DESCRIPTION:Instructor: {instr}\\nTime: {days} {st}-{et}
-END:VEVENT""")
+DESCRIPTION:{desc}
+END:VEVENT
+""".encode("utf-8")
+        if len(out) == len(CAL_HEADER): return None, "No events found"
         
-        if not events: return None, "No events found"
-        
-        cal = "\n".join(["BEGIN:VCALENDAR", "VERSION:2.0", "CALSCALE:GREGORIAN", VTIMEZONE_BLOCK, *events, "END:VCALENDAR"])
-        return cal, None
+        out += CAL_FOOTER
+        return bytes(out), None
     except Exception as e:
-        import traceback, textwrap
         tb = traceback.format_exc()
         return None, textwrap.shorten(tb, width=1000)
 
 
+def _warm_openpyxl() -> None:
+    """
+    Save and re-read an empty in-memory workbook once so openpyxl's lazily imported
+    reader/XML modules are loaded during container init rather than inside do_POST.
+    """
+    buf = BytesIO()
+    Workbook().save(buf)
+    wb = load_workbook(buf, read_only=True, data_only=True)
+    try:
+        for _ in wb.worksheets[0].iter_rows(values_only=True):
+            pass
+    finally:
+        wb.close()
+
+_warm_openpyxl()
+
+READ_CHUNK = 64 * 1024
+
+def read_form_file(headers, rfile, field: str = "file") -> bytes:
+    """
+    Stream the multipart request body through StreamingFormDataParser in
+    READ_CHUNK pieces and return the bytes of the named file part
+    (b"" if the part is missing).
+    """
+    parser = StreamingFormDataParser(headers=headers)
+    target = ValueTarget()
+    parser.register(field, target)
+
+    remaining = int(headers.get('Content-Length') or 0)
+    while remaining > 0:
+        chunk = rfile.read(min(remaining, READ_CHUNK))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        parser.data_received(chunk)
+    return target.value
+
+
 # This is the Vercel Serverless Function handler
 class handler(BaseHTTPRequestHandler):
     def do_POST(self):
         try:
             # 1. Parse the multipart form data
-            content_type, pdict = cgi.parse_header(self.headers.get('content-type'))
-            if content_type != 'multipart/form-data':
+            if self.headers.get_content_type() != 'multipart/form-data':
                 self.send_error_response(400, 'Invalid content type: must be multipart/form-data')
                 return
 
-            pdict['boundary'] = bytes(pdict['boundary'], "utf-8")
-            
-            fields = cgi.parse_multipart(self.rfile, pdict)
-            file_field = fields.get('file')
+            # Refuse oversized uploads before reading a single byte of the body
+            if int(self.headers.get('Content-Length') or 0) > MAX_UPLOAD_BYTES:
+                self.send_error_response(413, 'File too large')
+                return
+
+            try:
+                file_content = read_form_file(self.headers, self.rfile)
+            except ParseFailedException as e:
+                self.send_error_response(400, f'Malformed multipart body: {e}')
+                return
             
-            if not file_field or not file_field[0]:
+            if not file_content:
                 self.send_error_response(400, 'File data not found in request')
                 return
             
-            file_content = file_field[0]
-            
             # 2. Convert the file
             ics_data, error = convert_excel_to_ics(file_content)
 
@@ -221,8 +388,10 @@ class handler(BaseHTTPRequestHandler):
             self.send_response(200)
             self.send_header('Content-type', 'text/calendar')
             self.send_header('Content-Disposition', 'attachment; filename="courses.ics"')
+            # The body is already encoded, so its size is known before the headers go out
+            self.send_header('Content-Length', str(len(ics_data)))
             self.end_headers()
-            self.wfile.write(ics_data.encode('utf-8'))
+            self.wfile.write(ics_data)
 
         except Exception as e:
             # This is the crucial part: catch ANY other exception
@@ -231,10 +400,12 @@ class handler(BaseHTTPRequestHandler):
             self.send_error_response(500, "An internal server error occurred.", traceback=tb_str)
 
     def send_error_response(self, code, message, traceback=None):
-        self.send_response(code)
-        self.send_header('Content-type', 'application/json')
-        self.end_headers()
         error_payload = {'error': message}
         if traceback:
             error_payload['traceback'] = traceback
-        self.wfile.write(json.dumps(error_payload).encode('utf-8'))
+        body = json.dumps(error_payload).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
@@ -1,15 +1,35 @@
 import pandas as pd
 from ics import Calendar, Event
+from ics.grammar.parse import ContentLine
 import re
 from datetime import datetime, timedelta
-from dateutil import parser as date_parser
+from functools import lru_cache
 
-# Read the Excel file, skipping the first two rows
+# Read the Excel file once and locate the header row in-frame (Workday puts a title block above it)
 file_path = 'cpen2courses.xlsx'
-df = pd.read_excel(file_path, header=2)
+NEEDED_COLS = ['Course Listing', 'Meeting Patterns', 'Instructor']
+raw = pd.read_excel(file_path, header=None, dtype=str)  # every cell we use is text; skip type inference
+is_header = raw.eq('Course Listing').any(axis=1)
+if not is_header.any():
+    raise SystemExit(f"Could not find the 'Course Listing' header row in {file_path}")
+hdr_idx = is_header.idxmax()
+df = raw.iloc[hdr_idx + 1:].reset_index(drop=True)
+df.columns = raw.iloc[hdr_idx].values
+df = df[NEEDED_COLS]  # drop the ~20 registration-metadata columns before any per-column work
 
 cal = Calendar()
 
+PAREN_RE = re.compile(r'\s*\([^)]*\)')
+DAY_TOKENS = (('Mon', 'MO'), ('Tue', 'TU'), ('Wed', 'WE'), ('Thu', 'TH'), ('Fri', 'FR'), ('Sat', 'SA'), ('Sun', 'SU'))
+
+@lru_cache(maxsize=1024)  # term dates and slot times repeat across every course
+def parse_datetime(date_str, time_str):
+    # Workday times look like '4:00 p.m.' or '15:30PM' (stray suffix on a 24h time)
+    t = time_str.replace('.', '').replace(' ', '').upper()
+    if t[-2:] in ('AM', 'PM') and int(t.split(':', 1)[0]) <= 12:
+        return datetime.strptime(f'{date_str} {t}', '%Y-%m-%d %I:%M%p')
+    return datetime.strptime(f'{date_str} {t.rstrip("APM")}', '%Y-%m-%d %H:%M')
+
 def parse_meeting_pattern(pattern):
     # Example: '2025-09-05 - 2025-11-28 | Fri (Alternate weeks) | 4:00 p.m. - 6:00 p.m. | ESB-Floor 1-Room 1013'
     try:
@@ -32,17 +52,18 @@ def parse_meeting_pattern(pattern):
         start_time, end_time = time_parts[0].strip(), time_parts[1].strip()
         
         # Remove "(Alternate weeks)" or similar text from days
-        days = re.sub(r'\s*\([^)]*\)', '', days).strip()
+        days = PAREN_RE.sub('', days).strip()
         
         return start_date, end_date, days, start_time, end_time, location
     except Exception as e:
         print(f'Failed to parse meeting pattern: {pattern} | Error: {e}')
         return None, None, '', '', '', ''
 
-for idx, row in df.iterrows():
-    course = str(row.get('Course Listing', '')).strip()
-    meeting_patterns = str(row.get('Meeting Patterns', '')).strip()
-    instructor = str(row.get('Instructor', '')).strip()
+# Convert and strip the needed columns once, column-wise, then walk them in lockstep
+courses = df['Course Listing'].astype(str).str.strip().to_numpy()
+patterns = df['Meeting Patterns'].astype(str).str.strip().to_numpy()
+instructors = df['Instructor'].astype(str).str.strip().to_numpy()
+for idx, course, meeting_patterns, instructor in zip(df.index, courses, patterns, instructors):
     print(f'Row {idx}:')
     print(f'  Course: {course}')
     print(f'  Meeting Patterns: {meeting_patterns}')
@@ -61,20 +82,16 @@ for idx, row in df.iterrows():
             print('      Skipped: Missing parsed fields')
             continue
         # Parse days (e.g., 'Mon Wed Fri')
-        day_map = {'Mon': 'MO', 'Tue': 'TU', 'Wed': 'WE', 'Thu': 'TH', 'Fri': 'FR', 'Sat': 'SA', 'Sun': 'SU'}
-        byday = []
-        for d in day_map:
-            if d in days:
-                byday.append(day_map[d])
+        byday = [ical for tok, ical in DAY_TOKENS if tok in days]
         print(f'      BYDAY: {byday}')
         if not byday:
             print('      Skipped: No valid days')
             continue
-        # Parse start/end datetime using dateutil.parser
+        # Parse start/end datetime with strptime (formats are fixed by Workday)
         try:
-            start_dt = date_parser.parse(start_date + ' ' + start_time)
-            end_dt = date_parser.parse(start_date + ' ' + end_time)
-            until_dt = date_parser.parse(end_date + ' ' + end_time)
+            start_dt = parse_datetime(start_date, start_time)
+            end_dt = parse_datetime(start_date, end_time)
+            until_dt = parse_datetime(end_date, end_time)
         except Exception as e:
             print(f'      Skipped: Datetime parse error: {e}')
             print(f'      Debug - start_time: "{start_time}", end_time: "{end_time}"')
@@ -86,8 +103,6 @@ for idx, row in df.iterrows():
         event.location = location
         event.description = f'Instructor: {instructor}\nTime: {days} {start_time}-{end_time}'
         # Add recurrence rule (weekly for all courses, including biweekly ones)
-        from ics.grammar.parse import Container
-        from ics.grammar.parse import ContentLine
         rrule = ContentLine(name='RRULE', value=f'FREQ=WEEKLY;BYDAY={" ,".join(byday)};UNTIL={until_dt.strftime("%Y%m%dT%H%M%SZ")}')
         event.extra.append(rrule)
         cal.events.add(event)
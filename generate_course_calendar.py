@@ -10,18 +10,21 @@ Usage
 
 Dependencies
 ------------
-    pip install pandas python-dateutil ics pytz
+    pip install openpyxl
 """
 
 import argparse
 import re
-from datetime import datetime, timedelta
+import uuid
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from io import StringIO
+from itertools import count
 from pathlib import Path
+from typing import Iterable, Iterator, Tuple
+from zoneinfo import ZoneInfo
 
-import pandas as pd
-from dateutil import parser as dtparse
-from ics import Calendar, Event
-import pytz
+from openpyxl import load_workbook
 
 DAY_MAP = {
     'Mon': 0, 'Tue': 1, 'Wed': 2, 'Thu': 3,
@@ -29,13 +32,72 @@ DAY_MAP = {
 }
 ICAL_DAY = {v: k[:2].upper() for k, v in DAY_MAP.items()}  # 0 -> MO, etc.
 
-def clean_header(df: pd.DataFrame) -> pd.DataFrame:
-    """Slice off the two pre‑header rows and rename columns."""
-    core = df.iloc[2:].copy()
-    core.columns = df.iloc[1]
-    # Drop entirely blank columns that sometimes appear
-    core = core.loc[:, ~core.columns.isna()]
-    return core
+_DATE_RANGE = re.compile(r'(\d{4}-\d{2}-\d{2}) - (\d{4}-\d{2}-\d{2})')
+_ALT_WEEKS = re.compile(r'\(Alternate weeks\)')
+_TIME_RANGE = re.compile(r'([\d:.apm ]+)-([\d:.apm ]+)', re.I)
+
+NEEDED_COLS = ('Course Listing', 'Section', 'Meeting Patterns')
+
+# RFC 5545 TEXT escaping for SUMMARY / LOCATION values
+_ICS_TEXT_ESCAPE = str.maketrans({'\\': '\\\\', ',': '\\,', ';': '\\;', '\n': '\\n'})
+
+TZID = 'America/Vancouver'
+TZ = ZoneInfo(TZID)
+VTIMEZONE_BLOCK = """BEGIN:VTIMEZONE
+TZID:America/Vancouver
+BEGIN:STANDARD
+TZOFFSETFROM:-0700
+TZOFFSETTO:-0800
+TZNAME:PST
+DTSTART:19701101T020000
+RRULE:FREQ=YEARLY;BYMONTH=11;BYDAY=1SU
+END:STANDARD
+BEGIN:DAYLIGHT
+TZOFFSETFROM:-0800
+TZOFFSETTO:-0700
+TZNAME:PDT
+DTSTART:19700308T020000
+RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=2SU
+END:DAYLIGHT
+END:VTIMEZONE"""
+CAL_HEADER = f"BEGIN:VCALENDAR\nVERSION:2.0\nPRODID:-//ubc-xlsx-to-ics//EN\nCALSCALE:GREGORIAN\n{VTIMEZONE_BLOCK}\n"
+CAL_FOOTER = "END:VCALENDAR\n"
+
+def iter_course_rows(xlsx: Path, sheet_name: str = 'View My Courses') -> Iterator[Tuple]:
+    """Stream (course listing, section, meeting patterns) for every row below the header row."""
+    wb = load_workbook(xlsx, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        ws.reset_dimensions()  # Workday writes a bogus <dimension>, which truncates read_only rows
+        rows = ws.iter_rows(values_only=True)
+        for row in rows:
+            if 'Course Listing' in row:
+                header = {c: i for i, c in enumerate(row) if c is not None}
+                break
+        else:
+            raise RuntimeError("Could not find the 'Course Listing' header row")
+
+        missing = [c for c in NEEDED_COLS if c not in header]
+        if missing:
+            raise RuntimeError(f"Missing expected column(s): {', '.join(sorted(missing))}")
+        idx = [header[c] for c in NEEDED_COLS]
+
+        for row in rows:
+            yield tuple(row[i] if i < len(row) else None for i in idx)
+    finally:
+        wb.close()
+
+@lru_cache(maxsize=1024)
+def parse_date(dstr: str):
+    return datetime.strptime(dstr, '%Y-%m-%d').date()
+
+@lru_cache(maxsize=1024)
+def parse_time(tstr: str):
+    """'3:30 p.m.' / '15:30PM' / '15:30' -> datetime.time (24h times may carry a stray AM/PM)."""
+    cleaned = tstr.replace('.', '').replace(' ', '').upper()
+    if cleaned[-2:] in ('AM', 'PM') and int(cleaned.split(':', 1)[0]) <= 12:
+        return datetime.strptime(cleaned, '%I:%M%p').time()
+    return datetime.strptime(cleaned.rstrip('APM'), '%H:%M').time()
 
 def parse_meeting_pattern(meeting: str):
     """Return (date_start, date_end, weekdays, time_start, time_end, location, every_two_weeks)."""
@@ -45,15 +107,15 @@ def parse_meeting_pattern(meeting: str):
 
     # ---------- Date range ----------
     date_range = parts[0]
-    m = re.match(r'(\d{4}-\d{2}-\d{2}) - (\d{4}-\d{2}-\d{2})', date_range)
+    m = _DATE_RANGE.match(date_range)
     if not m:
         return None
-    date_start, date_end = map(lambda s: datetime.strptime(s, '%Y-%m-%d').date(), m.groups())
+    date_start, date_end = map(parse_date, m.groups())
 
     # ---------- Days ----------
     days_part = parts[1]
     every_two_weeks = 'Alternate weeks' in days_part
-    days_tokens = re.sub(r'\(Alternate weeks\)', '', days_part).strip().split()
+    days_tokens = _ALT_WEEKS.sub('', days_part).strip().split()
     weekdays = []
     for t in days_tokens:
         abbr = t[:3].title()
@@ -62,13 +124,9 @@ def parse_meeting_pattern(meeting: str):
 
     # ---------- Times ----------
     time_part = parts[2]
-    time_m = re.match(r'([\d:.apm ]+)-([\d:.apm ]+)', time_part, flags=re.I)
+    time_m = _TIME_RANGE.match(time_part)
     if not time_m:
         return None
-    def parse_time(tstr):
-        # Workday uses '3:30 p.m.'  -> remove periods, ensure am/pm
-        cleaned = tstr.lower().replace('.', '').strip()
-        return dtparse.parse(cleaned).time()
     time_start, time_end = map(parse_time, time_m.groups())
 
     # ---------- Location (optional) ----------
@@ -76,39 +134,67 @@ def parse_meeting_pattern(meeting: str):
 
     return date_start, date_end, weekdays, time_start, time_end, location, every_two_weeks
 
-def build_calendar(df: pd.DataFrame, tz_name='America/Vancouver') -> Calendar:
-    cal = Calendar()
-    tz = pytz.timezone(tz_name)
-
-    for _, row in df.iterrows():
-        meeting_info = parse_meeting_pattern(row['Meeting Patterns'])
+def first_meeting_date(date_start, date_end, weekdays, alt_weeks=False):
+    """Earliest meeting date in [date_start, date_end], or None; alt_weeks keeps even Mon-start weeks."""
+    offsets = []
+    for wd in set(weekdays):
+        off = wd - date_start.weekday()
+        if off < 0:
+            off += 14 if alt_weeks else 7  # week 0 slot is before the term starts
+        offsets.append(off)
+    if not offsets:
+        return None
+    first = date_start + timedelta(days=min(offsets))
+    return first if first <= date_end else None
+
+def _ics_ts(dt: datetime) -> str:
+    return f"{dt.year:04d}{dt.month:02d}{dt.day:02d}T{dt.hour:02d}{dt.minute:02d}{dt.second:02d}"
+
+def build_calendar(rows: Iterable[Tuple]) -> str:
+    """Return the VCALENDAR text; times are written as local America/Vancouver wall-clock times."""
+    dtstamp = f"{_ics_ts(datetime.now(timezone.utc))}Z"
+    uid_base = uuid.uuid4().hex
+    uid_nums = count(1)
+    cal = StringIO()
+    cal.write(CAL_HEADER)
+
+    for course, section, meeting in rows:
+        if not meeting:
+            continue
+        meeting_info = parse_meeting_pattern(str(meeting))
         if not meeting_info:
             continue
 
         date_start, date_end, weekdays, time_start, time_end, location, alt_weeks = meeting_info
-        course_name = str(row['Course Listing']).strip()
-        section = str(row['Section']).strip()
-        summary = f"{course_name} ({section})"
-
-        # Create weekly events over the span
-        current_date = date_start
-        week_counter = 0
-        while current_date <= date_end:
-            if current_date.weekday() in weekdays:
-                if alt_weeks and week_counter % 2 == 1:
-                    pass  # skip this week for alternate weeks
-                else:
-                    ev = Event()
-                    ev.name = summary
-                    ev.begin = tz.localize(datetime.combine(current_date, time_start))
-                    ev.end = tz.localize(datetime.combine(current_date, time_end))
-                    ev.location = location
-                    cal.events.add(ev)
-            # move to next day
-            current_date += timedelta(days=1)
-            if current_date.weekday() == 0:  # Monday starts a new academic week
-                week_counter += 1
-    return cal
+        course_name = str(course).strip()
+        section = str(section).strip()
+        summary = f"{course_name} ({section})".translate(_ICS_TEXT_ESCAPE)
+        loc_line = f"LOCATION:{location.translate(_ICS_TEXT_ESCAPE)}\n" if location else ''
+
+        # One recurring event per pattern, anchored on its first real meeting
+        first_date = first_meeting_date(date_start, date_end, weekdays, alt_weeks)
+        if first_date is None:
+            continue
+        begin = datetime.combine(first_date, time_start)
+        end = datetime.combine(first_date, time_end)
+        # UNTIL must be UTC when DTSTART carries a TZID (RFC 5545 §3.3.10)
+        until = datetime.combine(date_end, time_end, tzinfo=TZ).astimezone(timezone.utc)
+        byday = ','.join(ICAL_DAY[wd] for wd in sorted(set(weekdays)))
+        interval = ';INTERVAL=2' if alt_weeks else ''
+        cal.write(
+            "BEGIN:VEVENT\n"
+            f"UID:{uid_base}-{next(uid_nums)}@ubc-xlsx-to-ics\n"
+            f"DTSTAMP:{dtstamp}\n"
+            f"SUMMARY:{summary}\n"
+            f"DTSTART;TZID={TZID}:{_ics_ts(begin)}\n"
+            f"DTEND;TZID={TZID}:{_ics_ts(end)}\n"
+            f"RRULE:FREQ=WEEKLY{interval};BYDAY={byday};UNTIL={_ics_ts(until)}Z\n"
+            f"{loc_line}"
+            "END:VEVENT\n"
+        )
+
+    cal.write(CAL_FOOTER)
+    return cal.getvalue()
 
 def main():
     parser = argparse.ArgumentParser(description="Convert UBC View My Courses spreadsheet to .ics")
@@ -119,18 +205,11 @@ def main():
     if not args.xlsx.exists():
         parser.error(f"Input file {args.xlsx} does not exist")
 
-    df_raw = pd.read_excel(args.xlsx, sheet_name='View My Courses', engine='openpyxl')
-    df = clean_header(df_raw)
-
-    needed_cols = {'Course Listing', 'Section', 'Meeting Patterns'}
-    if not needed_cols.issubset(df.columns):
-        missing = ', '.join(sorted(needed_cols - set(df.columns)))
-        raise RuntimeError(f"Missing expected column(s): {missing}")
-
-    cal = build_calendar(df)
+    cal = build_calendar(iter_course_rows(args.xlsx))
 
-    with args.output.open('w', encoding='utf-8') as f:
-        f.writelines(cal.serialize_iter())
+    # RFC 5545 lines end in CRLF; the calendar text is built with '\n'
+    with args.output.open('w', encoding='utf-8', newline='\r\n') as f:
+        f.write(cal)
 
     print(f"✅ Calendar saved to {args.output}")
 
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The converters are top-level scripts, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,56 @@
+from datetime import date, datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from generate_course_calendar import build_calendar
+
+rrulestr = pytest.importorskip('dateutil.rrule').rrulestr
+
+TZ = ZoneInfo('America/Vancouver')
+
+
+def _events(ics: str):
+    events, cur = [], None
+    for line in ics.splitlines():
+        if line == 'BEGIN:VEVENT':
+            cur = {}
+        elif line == 'END:VEVENT':
+            events.append(cur)
+            cur = None
+        elif cur is not None:
+            key, _, value = line.partition(':')
+            cur[key.split(';', 1)[0]] = value
+    return events
+
+
+def _expand(event):
+    """Expand an event's RRULE against a tz-aware DTSTART, as strict clients do."""
+    dtstart = datetime.strptime(event['DTSTART'], '%Y%m%dT%H%M%S').replace(tzinfo=TZ)
+    return [d.date() for d in rrulestr(event['RRULE'], dtstart=dtstart)]
+
+
+def _expected(date_start, date_end, weekdays, alt_weeks=False):
+    week0 = date_start - timedelta(days=date_start.weekday())
+    days, d = [], date_start
+    while d <= date_end:
+        if d.weekday() in weekdays and (not alt_weeks or (d - week0).days // 7 % 2 == 0):
+            days.append(d)
+        d += timedelta(days=1)
+    return days
+
+
+@pytest.mark.parametrize('meeting, date_start, date_end, weekdays, alt_weeks', [
+    # Last meeting falls after the DST switch, at the very end of the UNTIL bound
+    ('2025-09-03 - 2025-12-05 | Mon Wed Fri | 5:00 p.m. - 6:00 p.m. | ESB-1013',
+     date(2025, 9, 3), date(2025, 12, 5), {0, 2, 4}, False),
+    ('2025-09-05 - 2025-11-28 | Fri (Alternate weeks) | 4:00 p.m. - 6:00 p.m. | ESB-1013',
+     date(2025, 9, 5), date(2025, 11, 28), {4}, True),
+    ('2026-01-06 - 2026-04-09 | Tue Thu | 15:30PM-17:00PM',
+     date(2026, 1, 6), date(2026, 4, 9), {1, 3}, False),
+])
+def test_rrule_expands_with_tz_aware_dtstart(meeting, date_start, date_end, weekdays, alt_weeks):
+    ics = build_calendar([('CPEN_V 211', 'CPEN_V 211-101', meeting)])
+    (event,) = _events(ics)
+    assert event['RRULE'].split('UNTIL=', 1)[1].endswith('Z')
+    assert _expand(event) == _expected(date_start, date_end, weekdays, alt_weeks)